@@ -0,0 +1,211 @@
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+# Nombre de lignes récupérées par requête lors du chargement initial
+TAILLE_PAGE = 1000
+
+
+# Conversion d'une valeur renvoyée par Supabase (chaîne ISO ou date) en date
+def _en_date(valeur):
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    return date.fromisoformat(str(valeur)[:10])
+
+
+# Matrice de présence membres × dates de culte.
+# Chaque ligne correspond à un membre, chaque colonne à une date de culte
+# (triées par ordre chronologique). La matrice est chargée une seule fois
+# depuis fact_presence_au_culte puis mise à jour à chaque nouvelle présence,
+# ce qui permet de calculer les listes de suivi sans requête par membre.
+class MatricePresence:
+    def __init__(self, capacite_membres=256, capacite_dates=64):
+        self.member_ids = []
+        self.index_membres = {}
+        self.dates = []
+        self.index_dates = {}
+        self.bits = np.zeros((capacite_membres, capacite_dates), dtype=bool)
+        self.verrou = threading.Lock()
+
+    # Chargement de toutes les présences en une seule passe paginée
+    @classmethod
+    def depuis_supabase(cls, supabase):
+        lignes = []
+        debut = 0
+        while True:
+            response = supabase.table("fact_presence_au_culte").select("member_id", "date").order("id").range(debut, debut + TAILLE_PAGE - 1).execute()
+            lignes.extend(response.data)
+            if len(response.data) < TAILLE_PAGE:
+                break
+            debut += TAILLE_PAGE
+        return cls.depuis_lignes(lignes)
+
+    # Construction vectorisée de la matrice à partir d'une liste de présences
+    @classmethod
+    def depuis_lignes(cls, lignes):
+        member_ids = list(dict.fromkeys(ligne["member_id"] for ligne in lignes))
+        dates = sorted({_en_date(ligne["date"]) for ligne in lignes})
+        matrice = cls(capacite_membres=max(len(member_ids), 256), capacite_dates=max(len(dates), 64))
+        matrice.member_ids = member_ids
+        matrice.index_membres = {member_id: i for i, member_id in enumerate(member_ids)}
+        matrice.dates = dates
+        matrice.index_dates = {jour: j for j, jour in enumerate(dates)}
+        if lignes:
+            lignes_idx = np.fromiter((matrice.index_membres[ligne["member_id"]] for ligne in lignes), dtype=np.intp, count=len(lignes))
+            colonnes_idx = np.fromiter((matrice.index_dates[_en_date(ligne["date"])] for ligne in lignes), dtype=np.intp, count=len(lignes))
+            matrice.bits[lignes_idx, colonnes_idx] = True
+        return matrice
+
+    @property
+    def nb_membres(self):
+        return len(self.member_ids)
+
+    @property
+    def nb_dates(self):
+        return len(self.dates)
+
+    # Vue sur la partie utile de la matrice (sans la capacité de réserve)
+    def vue(self):
+        return self.bits[:self.nb_membres, :self.nb_dates]
+
+    # Agrandissement de la matrice en doublant la capacité si nécessaire
+    def _reserver(self, nb_membres, nb_dates):
+        capacite_membres, capacite_dates = self.bits.shape
+        if nb_membres <= capacite_membres and nb_dates <= capacite_dates:
+            return
+        while capacite_membres < nb_membres:
+            capacite_membres *= 2
+        while capacite_dates < nb_dates:
+            capacite_dates *= 2
+        bits = np.zeros((capacite_membres, capacite_dates), dtype=bool)
+        bits[:self.nb_membres, :self.nb_dates] = self.vue()
+        self.bits = bits
+
+    def _ligne_membre(self, member_id):
+        if member_id not in self.index_membres:
+            self._reserver(self.nb_membres + 1, self.nb_dates)
+            self.index_membres[member_id] = self.nb_membres
+            self.member_ids.append(member_id)
+        return self.index_membres[member_id]
+
+    def _colonne_date(self, jour):
+        if jour in self.index_dates:
+            return self.index_dates[jour]
+        self._reserver(self.nb_membres, self.nb_dates + 1)
+        n = self.nb_dates
+        # Cas habituel : la nouvelle date est la plus récente
+        position = n
+        while position > 0 and self.dates[position - 1] > jour:
+            position -= 1
+        if position < n:
+            # Décaler les colonnes suivantes pour garder l'ordre chronologique
+            self.bits[:, position + 1:n + 1] = self.bits[:, position:n]
+            self.bits[:, position] = False
+        self.dates.insert(position, jour)
+        if position < n:
+            self.index_dates = {d: j for j, d in enumerate(self.dates)}
+        else:
+            self.index_dates[jour] = position
+        return position
+
+    # Mise à jour incrémentale après l'enregistrement d'une présence
+    def ajouter_presence(self, member_id, jour):
+        jour = _en_date(jour)
+        with self.verrou:
+            ligne = self._ligne_membre(member_id)
+            colonne = self._colonne_date(jour)
+            self.bits[ligne, colonne] = True
+
+    # Reporter le changement d'identifiant lors de la conversion invité -> membre
+    def renommer_membre(self, ancien_id, nouveau_id):
+        with self.verrou:
+            if ancien_id not in self.index_membres:
+                return
+            ligne = self.index_membres.pop(ancien_id)
+            self.member_ids[ligne] = nouveau_id
+            self.index_membres[nouveau_id] = ligne
+
+    # Nombre de cultes manqués depuis la dernière présence de chaque membre
+    def _absences_finales(self, vue):
+        dernier = vue.shape[1] - 1 - np.argmax(vue[:, ::-1], axis=1)
+        return vue.shape[1] - 1 - dernier, dernier
+
+    def _filtre_membres(self, member_ids):
+        if member_ids is None:
+            return np.ones(self.nb_membres, dtype=bool)
+        lignes = [self.index_membres[m] for m in member_ids if m in self.index_membres]
+        masque = np.zeros(self.nb_membres, dtype=bool)
+        masque[lignes] = True
+        return masque
+
+    # Membres absents aux `min_absences` derniers cultes (ou plus) d'affilée
+    def absences_consecutives(self, min_absences=3, member_ids=None):
+        with self.verrou:
+            vue = self.vue()
+            if vue.size == 0:
+                return []
+            absences, dernier = self._absences_finales(vue)
+            masque = vue.any(axis=1) & (absences >= min_absences) & self._filtre_membres(member_ids)
+            lignes = np.flatnonzero(masque)
+            lignes = lignes[np.argsort(-absences[lignes], kind="stable")]
+            return [{
+                "member_id": self.member_ids[i],
+                "absences_consecutives": int(absences[i]),
+                "derniere_presence": self.dates[dernier[i]],
+            } for i in lignes]
+
+    # Personnes venues exactement `nb_visites` fois et absentes depuis
+    def visiteurs_sans_retour(self, nb_visites=2, min_absences=1, member_ids=None):
+        with self.verrou:
+            vue = self.vue()
+            if vue.size == 0:
+                return []
+            visites = vue.sum(axis=1)
+            absences, dernier = self._absences_finales(vue)
+            masque = (visites == nb_visites) & (absences >= min_absences) & self._filtre_membres(member_ids)
+            lignes = np.flatnonzero(masque)
+            lignes = lignes[np.argsort(-absences[lignes], kind="stable")]
+            return [{
+                "member_id": self.member_ids[i],
+                "visites": int(visites[i]),
+                "absences_consecutives": int(absences[i]),
+                "derniere_presence": self.dates[dernier[i]],
+            } for i in lignes]
+
+    # Plus longue interruption (en cultes) entre deux présences de chaque membre
+    def plus_longues_absences(self):
+        with self.verrou:
+            vue = self.vue()
+            ecarts = np.zeros(self.nb_membres, dtype=np.int64)
+            lignes, colonnes = np.nonzero(vue)
+            if lignes.size > 1:
+                meme_membre = lignes[1:] == lignes[:-1]
+                np.maximum.at(ecarts, lignes[1:][meme_membre], np.diff(colonnes)[meme_membre] - 1)
+            return dict(zip(self.member_ids, ecarts.tolist()))
+
+    # Taux de retour des nouveaux venus (`member_ids`), regroupés par date de premier culte :
+    # part des personnes revenues au moins une fois dans les `horizon` cultes suivants.
+    # Les dates trop récentes pour couvrir tout l'horizon sont ignorées.
+    def taux_retention(self, member_ids, horizon=4):
+        with self.verrou:
+            vue = self.vue()
+            if vue.size == 0:
+                return []
+            nouveaux = vue.any(axis=1) & self._filtre_membres(member_ids)
+            premier = np.argmax(vue, axis=1)[nouveaux]
+            complet = premier + horizon <= vue.shape[1] - 1
+            premier = premier[complet]
+            cumul = np.cumsum(vue[nouveaux][complet], axis=1, dtype=np.int32)
+            lignes = np.arange(premier.size)
+            revenus = (cumul[lignes, premier + horizon] - cumul[lignes, premier]) > 0
+            nouveaux_par_date = np.bincount(premier, minlength=vue.shape[1])
+            revenus_par_date = np.bincount(premier, weights=revenus, minlength=vue.shape[1])
+            return [{
+                "date": self.dates[j],
+                "nouveaux": int(nouveaux_par_date[j]),
+                "revenus": int(revenus_par_date[j]),
+                "taux": float(revenus_par_date[j] / nouveaux_par_date[j]),
+            } for j in np.flatnonzero(nouveaux_par_date)]
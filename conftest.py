@@ -0,0 +1 @@
+# Présent à la racine pour que pytest puisse importer les modules de l'application
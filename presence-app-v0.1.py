@@ -1,7 +1,10 @@
 import streamlit as st
 from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
-import re
+from analytics_presence import MatricePresence
+from sessions_culte import SITES, SERVICES, RegistreSessions
+from validation import IndexContacts, normaliser_champ, valider_champ, valider_formulaire
 
 # Initialisation des variables d'état
 if "init" not in st.session_state:
@@ -14,6 +17,8 @@ if "init" not in st.session_state:
     st.session_state.form_key = "presence_form_initial"
     st.session_state.page = "attendance"  # Page par défaut
     st.session_state.visitor_checkboxes = {}  # Pour stocker l'état des cases à cocher
+    st.session_state.site = SITES[0]  # Site par défaut
+    st.session_state.service = SERVICES[0]  # Culte par défaut
 
 # Fonction pour réinitialiser l'état
 def reset_state():
@@ -37,7 +42,102 @@ supabase_url = st.secrets["supabase"]["url"]
 supabase_key = st.secrets["supabase"]["key"]
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Pool de threads borné partagé pour les lectures indépendantes
+@st.cache_resource
+def pool_requetes():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="supabase")
+
+# Exécuter des lectures indépendantes en parallèle et attendre tous les résultats.
+# Les requêtes tournent hors du script Streamlit : elles ne doivent appeler aucune
+# fonction st.* ; l'affichage se fait ensuite sur le thread principal.
+def executer_en_parallele(*requetes):
+    pool = pool_requetes()
+    futures = [pool.submit(requete) for requete in requetes]
+    return [future.result() for future in futures]
+
+# Structures en mémoire partagées entre les connexions. Elles restent vides
+# tant qu'aucune page n'en a eu besoin : une présence enregistrée ne déclenche
+# jamais le chargement de tout l'historique.
+@st.cache_resource
+def structures_en_memoire():
+    return {}
+
+STRUCTURES = structures_en_memoire()
+
+# Matrice de présence, chargée une seule fois à la première consultation
+def charger_matrice_presence():
+    matrice = STRUCTURES.get("matrice")
+    if matrice is None:
+        matrice = STRUCTURES.setdefault("matrice", MatricePresence.depuis_supabase(supabase))
+    return matrice
+
+# Lire toutes les lignes d'une requête, page par page, dans un ordre stable
+def lire_toutes_les_lignes(construire_requete, taille_page=1000):
+    lignes = []
+    debut = 0
+    while True:
+        response = construire_requete().range(debut, debut + taille_page - 1).execute()
+        lignes.extend(response.data)
+        if len(response.data) < taille_page:
+            return lignes
+        debut += taille_page
+
+# Mettre à jour une structure en mémoire après une écriture en base, si elle
+# est déjà chargée. Une erreur ici ne doit pas changer le résultat de l'écriture :
+# la structure est simplement invalidée et sera rechargée au prochain accès.
+def mettre_a_jour_en_memoire(nom, mise_a_jour):
+    structure = STRUCTURES.get(nom)
+    if structure is None:
+        return
+    try:
+        mise_a_jour(structure)
+    except Exception:
+        STRUCTURES.pop(nom, None)
+
+# Registre des sessions de culte (site, service, date) partagé entre les connexions
+@st.cache_resource
+def charger_registre_sessions():
+    return RegistreSessions(supabase)
+
+# Index local des contacts et emails pour le pré-contrôle des doublons
+def charger_index_contacts():
+    index = STRUCTURES.get("index_contacts")
+    if index is None:
+        index = STRUCTURES.setdefault("index_contacts", IndexContacts.depuis_supabase(supabase))
+    return index
+
+# Index des contacts, ou None s'il ne peut pas être chargé : le pré-contrôle
+# local est alors ignoré et les doublons sont détectés par la base (23505)
+def index_contacts_disponible():
+    try:
+        return charger_index_contacts()
+    except Exception:
+        return None
+
+# Afficher l'erreur d'un champ pendant la saisie, une fois le champ renseigné
+def afficher_erreur_champ(champ, valeur, nom="", prenoms=""):
+    if not valeur:
+        return
+    erreur = valider_champ(champ, valeur)
+    index_contacts = None
+    if not erreur and champ in ("contact", "email") and nom.strip() and prenoms.strip():
+        index_contacts = index_contacts_disponible()
+    if index_contacts is not None:
+        erreur = index_contacts.verifier_champ(
+            champ,
+            normaliser_champ(champ, valeur),
+            normaliser_champ("nom", nom),
+            normaliser_champ("prenoms", prenoms)
+        )
+    if erreur:
+        st.caption(f":red[{erreur}]")
+
+# Session de culte sélectionnée dans la barre latérale
+def session_en_cours():
+    return charger_registre_sessions().session(st.session_state.site, st.session_state.service)
+
 # Fonction pour générer un ID temporaire (TEMP00X)
+# Renvoie (member_id, message d'erreur ou None) pour être appelée hors du thread principal
 def generate_temp_id():
     try:
         # Récupérer tous les member_id
@@ -45,12 +145,12 @@ def generate_temp_id():
         # Filtrer les ID commençant par TEMP côté client
         temp_ids = [entry['member_id'] for entry in response.data if entry['member_id'].startswith('TEMP')]
         count = len(temp_ids) + 1
-        return f"TEMP{count:03d}"  # Exemple : TEMP001, TEMP002, etc.
+        return f"TEMP{count:03d}", None  # Exemple : TEMP001, TEMP002, etc.
     except Exception as e:
-        st.error(f"Erreur lors de la génération de l'ID temporaire: {e}")
-        return "TEMP001"  # Valeur par défaut en cas d'erreur
+        return "TEMP001", f"Erreur lors de la génération de l'ID temporaire: {e}"  # Valeur par défaut en cas d'erreur
 
 # Fonction pour générer un ID membre (MEMBER0000X)
+# Renvoie (member_id, message d'erreur ou None) pour être appelée hors du thread principal
 def generate_member_id():
     try:
         # Récupérer tous les member_id
@@ -58,36 +158,17 @@ def generate_member_id():
         # Filtrer les ID commençant par MEMBER côté client
         member_ids = [entry['member_id'] for entry in response.data if entry['member_id'].startswith('MEMBER')]
         count = len(member_ids) + 1
-        return f"MEMBER{count:05d}"  # Format avec 5 chiffres, ex: MEMBER00001
+        return f"MEMBER{count:05d}", None  # Format avec 5 chiffres, ex: MEMBER00001
     except Exception as e:
-        st.error(f"Erreur lors de la génération de l'ID membre: {e}")
-        return "MEMBER00001"  # Valeur par défaut en cas d'erreur
-
-# Validation de l'email
-def is_valid_email(email):
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(email_pattern, email)) if email else True
-
-# Validation et formatage du numéro de téléphone
-def is_valid_phone(phone):
-    cleaned_phone = re.sub(r'[\s\-().]+', '', phone)
-    phone_pattern = r'^(\+?\d{8,15})$'
-    return bool(re.match(phone_pattern, cleaned_phone))
-
-def format_phone_number(phone):
-    cleaned_phone = re.sub(r'[\s\-().]+', '', phone)
-    if not cleaned_phone.startswith('+'):
-        if len(cleaned_phone) == 10:
-            cleaned_phone = "+225" + cleaned_phone
-        else:
-            cleaned_phone = "+" + cleaned_phone
-    return cleaned_phone
+        return "MEMBER00001", f"Erreur lors de la génération de l'ID membre: {e}"  # Valeur par défaut en cas d'erreur
 
 # Fonction pour convertir un invité en membre
 def convert_visitor_to_member(member_id):
     try:
         # Générer un nouvel ID de membre
-        new_member_id = generate_member_id()
+        new_member_id, erreur_id = generate_member_id()
+        if erreur_id:
+            st.error(erreur_id)
         
         # 1. Créer une copie temporaire des données de présence
         presence_data = supabase.table("fact_presence_au_culte").select("*").eq("member_id", member_id).execute()
@@ -119,6 +200,9 @@ def convert_visitor_to_member(member_id):
         if bulk_data:
             supabase.table("fact_presence_au_culte").insert(bulk_data).execute()
         
+        mettre_a_jour_en_memoire("matrice", lambda matrice: matrice.renommer_membre(member_id, new_member_id))
+        charger_registre_sessions().renommer_membre(member_id, new_member_id)
+        mettre_a_jour_en_memoire("index_contacts", lambda index: index.renommer_membre(member_id, new_member_id))
         return True, new_member_id
     except Exception as e:
         return False, str(e)
@@ -159,6 +243,30 @@ with st.sidebar:
                 type="primary" if st.session_state.page == "new_visitors" else "secondary"):
         st.session_state.page = "new_visitors"
         st.rerun()
+    
+    if st.button("📋 Suivi des Absences", 
+                key="btn_followup", 
+                use_container_width=True,
+                type="primary" if st.session_state.page == "followup" else "secondary"):
+        st.session_state.page = "followup"
+        st.rerun()
+    
+    # Choix du site et du culte en cours
+    st.markdown("---")
+    st.session_state.site = st.selectbox("Site", SITES, index=SITES.index(st.session_state.site))
+    st.session_state.service = st.selectbox("Culte", SERVICES, index=SERVICES.index(st.session_state.service))
+    
+    # Compteurs en direct des présences du jour pour chaque site et chaque culte
+    try:
+        registre = charger_registre_sessions()
+        sessions = executer_en_parallele(*[
+            (lambda site=site, service=service: registre.session(site, service))
+            for site in SITES for service in SERVICES
+        ])
+        for session in sessions:
+            st.metric(f"{session.site} · {session.service}", session.nb_presents)
+    except Exception as e:
+        st.error(f"Erreur lors du chargement de la session: {e}")
 
 # Page d'enregistrement de présence
 if st.session_state.page == "attendance":
@@ -176,27 +284,35 @@ if st.session_state.page == "attendance":
     st.write("Veuillez entrer vos informations de contact")
     st.write("")
 
-    # Formulaire principal
-    with st.form(key=st.session_state.form_key, clear_on_submit=False):
-        nom = st.text_input("Nom")
-        prenoms = st.text_input("Prénoms")
-        sexe = st.selectbox("Sexe", ["Masculin", "Féminin"], index=0)
+    # Formulaire principal (hors st.form pour valider chaque champ pendant la saisie)
+    form_key = st.session_state.form_key
+    with st.container(border=True):
+        nom = st.text_input("Nom", key=f"{form_key}_nom")
+        afficher_erreur_champ("nom", nom)
+        prenoms = st.text_input("Prénoms", key=f"{form_key}_prenoms")
+        afficher_erreur_champ("prenoms", prenoms)
+        sexe = st.selectbox("Sexe", ["Masculin", "Féminin"], index=0, key=f"{form_key}_sexe")
         date_naissance = st.date_input(
             "Date de naissance",
             value=date(2000, 1, 1),
             min_value=date(1900, 1, 1),
             max_value=date.today(),
-            format="DD/MM/YYYY"
+            format="DD/MM/YYYY",
+            key=f"{form_key}_date_naissance"
         )
-        contact = st.text_input("Contact", help="Ex: 0102030405 ou +22501020304")
-        email = st.text_input("Email", help="Ex: nom@domaine.com (optionnel)")
-        lieu_habitation = st.text_input("Lieu d'habitation")
+        afficher_erreur_champ("date_naissance", date_naissance)
+        contact = st.text_input("Contact", help="Ex: 0102030405 ou +22501020304", key=f"{form_key}_contact")
+        afficher_erreur_champ("contact", contact, nom, prenoms)
+        email = st.text_input("Email", help="Ex: nom@domaine.com (optionnel)", key=f"{form_key}_email")
+        afficher_erreur_champ("email", email, nom, prenoms)
+        lieu_habitation = st.text_input("Lieu d'habitation", key=f"{form_key}_lieu_habitation")
+        afficher_erreur_champ("lieu_habitation", lieu_habitation)
         
         col_question = st.container()
         col_question.markdown("<span>Assistez-vous au culte pour la première fois ?</span>", unsafe_allow_html=True)
-        first_time = col_question.radio("", ["Oui", "Non"], horizontal=True, label_visibility="collapsed")
+        first_time = col_question.radio("", ["Oui", "Non"], horizontal=True, label_visibility="collapsed", key=f"{form_key}_first_time")
         
-        submit_button = st.form_submit_button("Confirmer présence")
+        submit_button = st.button("Confirmer présence", key=f"{form_key}_submit")
 
     # Conteneur pour les messages
     message_container = st.container()
@@ -207,55 +323,41 @@ if st.session_state.page == "attendance":
         st.session_state.show_success = False
         st.session_state.show_warning = False
         
-        input_valid = True
-        
-        if not nom.strip():
-            st.session_state.validation_errors["nom"] = "Le nom est obligatoire"
-            input_valid = False
-        if not prenoms.strip():
-            st.session_state.validation_errors["prenoms"] = "Les prénoms sont obligatoires"
-            input_valid = False
-        if not sexe:
-            st.session_state.validation_errors["sexe"] = "Le sexe est obligatoire"
-            input_valid = False
-        if not date_naissance:
-            st.session_state.validation_errors["date_naissance"] = "La date de naissance est obligatoire"
-            input_valid = False
-        elif (date.today() - date_naissance).days // 365 > 120:
-            st.session_state.validation_errors["date_naissance"] = "Date de naissance incorrecte"
-            input_valid = False
-        if not contact.strip():
-            st.session_state.validation_errors["contact"] = "Le contact est obligatoire"
-            input_valid = False
-        elif not is_valid_phone(contact.strip()):
-            st.session_state.validation_errors["contact"] = "Format de numéro invalide"
-            input_valid = False
-        email_lower = email.strip().lower()
-        if email_lower and not is_valid_email(email_lower):
-            st.session_state.validation_errors["email"] = "Format d'email invalide"
-            input_valid = False
-        if not lieu_habitation.strip():
-            st.session_state.validation_errors["lieu_habitation"] = "Le lieu d'habitation est obligatoire"
-            input_valid = False
+        # Validation, normalisation et pré-contrôle local des doublons avant toute écriture
+        donnees, erreurs = valider_formulaire({
+            "nom": nom,
+            "prenoms": prenoms,
+            "sexe": sexe,
+            "date_naissance": date_naissance,
+            "contact": contact,
+            "email": email,
+            "lieu_habitation": lieu_habitation
+        }, index_contacts_disponible())
+        st.session_state.validation_errors = erreurs
         
-        if input_valid:
-            nom_formate = nom.strip().upper()
-            prenoms_formate = prenoms.strip().title()
-            contact_formate = format_phone_number(contact.strip())
-            email_formate = email_lower if email_lower else None
-            lieu_habitation_formate = lieu_habitation.strip().title()
+        if donnees:
+            nom_formate = donnees["nom"]
+            prenoms_formate = donnees["prenoms"]
+            contact_formate = donnees["contact"]
+            email_formate = donnees["email"]
+            lieu_habitation_formate = donnees["lieu_habitation"]
             
-            # Déterminer le type_membre et le member_id
+            # Déterminer le type_membre et le générateur de member_id
             if first_time == "Oui":
                 type_membre = 'INVITE'
-                member_id = generate_temp_id()
+                generer_id = generate_temp_id
             else:
                 type_membre = 'MEMBRE'
-                member_id = generate_member_id()
+                generer_id = generate_member_id
             
             try:
-                # Vérifier si le membre existe déjà
-                response = supabase.table("dim_membres").select("member_id", "date_de_premier_culte").eq("nom", nom_formate).eq("prenoms", prenoms_formate).execute()
+                # Pré-allouer l'ID et vérifier si le membre existe déjà, en parallèle
+                (member_id, erreur_id), response = executer_en_parallele(
+                    generer_id,
+                    lambda: supabase.table("dim_membres").select("member_id", "date_de_premier_culte").eq("nom", nom_formate).eq("prenoms", prenoms_formate).execute()
+                )
+                if erreur_id:
+                    st.error(erreur_id)
                 
                 if response.data:
                     member_id = response.data[0]["member_id"]
@@ -289,21 +391,27 @@ if st.session_state.page == "attendance":
                         "lieu_d_habitation": lieu_habitation_formate,
                         "date_de_premier_culte": date_premier_culte
                     }).execute()
+                
+                mettre_a_jour_en_memoire("index_contacts", lambda index: index.enregistrer(member_id, nom_formate, prenoms_formate, contact_formate, email_formate))
 
-                # Enregistrement de la présence
-                today_str = date.today().isoformat()
-                presence_response = supabase.table("fact_presence_au_culte").select("member_id", count="exact").eq("member_id", member_id).eq("date", today_str).execute()
+                # Enregistrement de la présence (doublon vérifié localement sur la session)
+                session = session_en_cours()
                 
-                if presence_response.count == 0:
-                    supabase.table("fact_presence_au_culte").insert({
-                        "member_id": member_id,
-                        "nom": nom_formate,
-                        "prenoms": prenoms_formate,
-                        "date": today_str,
-                        "est_nouveau": first_time == "Oui",
-                        "est_present": True,
-                        "souhaite_rester": False  # Valeur par défaut
-                    }).execute()
+                if session.reserver(member_id):
+                    try:
+                        supabase.table("fact_presence_au_culte").insert({
+                            "member_id": member_id,
+                            "nom": nom_formate,
+                            "prenoms": prenoms_formate,
+                            **session.champs_presence(),
+                            "est_nouveau": first_time == "Oui",
+                            "est_present": True,
+                            "souhaite_rester": False  # Valeur par défaut
+                        }).execute()
+                    except Exception:
+                        session.liberer(member_id)
+                        raise
+                    mettre_a_jour_en_memoire("matrice", lambda matrice: matrice.ajouter_presence(member_id, session.jour))
                     st.session_state.show_success = True
                     st.session_state.form_submitted = True
                 else:
@@ -338,7 +446,7 @@ if st.session_state.page == "attendance":
                     st.rerun()
 
             if st.session_state.show_warning:
-                st.warning("⚠️ Ce membre est déjà enregistré pour aujourd'hui !")
+                st.warning("⚠️ Ce membre est déjà enregistré pour ce culte !")
                 if st.button("Retour à l'accueil", key="return_home"):
                     st.session_state.reset_requested = True
                     st.rerun()
@@ -350,9 +458,16 @@ elif st.session_state.page == "new_visitors":
     
     # Obtenir la liste des nouveaux visiteurs (TEMP*)
     try:
-        # Récupérer les informations des invités
-        response = supabase.table("dim_membres").select("*").eq("type_membre", "INVITE").execute()
-        new_visitors = response.data
+        # Récupérer les invités et leurs présences en parallèle
+        new_visitors, presences_invites = executer_en_parallele(
+            lambda: lire_toutes_les_lignes(lambda: supabase.table("dim_membres").select("*").eq("type_membre", "INVITE").order("member_id")),
+            lambda: lire_toutes_les_lignes(lambda: supabase.table("fact_presence_au_culte").select("member_id", "souhaite_rester").like("member_id", "TEMP%").order("id"))
+        )
+        
+        # Premier état souhaite_rester connu pour chaque invité
+        etats_presence = {}
+        for entry in presences_invites:
+            etats_presence.setdefault(entry["member_id"], entry.get("souhaite_rester", False))
         
         if new_visitors:
             # Créer un dictionnaire pour stocker l'état des cases à cocher s'il n'existe pas déjà
@@ -391,11 +506,8 @@ elif st.session_state.page == "new_visitors":
                 if apply_filter and date_premier_culte and date_premier_culte != filter_date.isoformat():
                     continue
                 
-                # Obtenir l'état actuel du champ souhaite_rester dans la base de données
-                presence_response = supabase.table("fact_presence_au_culte").select("souhaite_rester").eq("member_id", member_id).execute()
-                souhaite_rester = False
-                if presence_response.data:
-                    souhaite_rester = presence_response.data[0].get("souhaite_rester", False)
+                # État actuel du champ souhaite_rester dans la base de données
+                souhaite_rester = etats_presence.get(member_id, False)
                 
                 # Initialiser l'état de la case à cocher dans session_state s'il n'existe pas
                 if member_id not in st.session_state.visitor_checkboxes:
@@ -478,4 +590,76 @@ elif st.session_state.page == "new_visitors":
             st.info("Aucune nouvelle personne enregistrée pour le moment.")
     
     except Exception as e:
-        st.error(f"Erreur lors de la récupération des données: {e}")
\ No newline at end of file
+        st.error(f"Erreur lors de la récupération des données: {e}")
+
+# Page de suivi des absences
+elif st.session_state.page == "followup":
+    st.title("📋 Suivi des Absences")
+    st.write("Listes de suivi pastoral calculées à partir de l'historique des présences.")
+    
+    try:
+        # Charger la matrice et les informations de contact en parallèle
+        matrice, lignes_membres = executer_en_parallele(
+            charger_matrice_presence,
+            lambda: lire_toutes_les_lignes(lambda: supabase.table("dim_membres").select("member_id", "type_membre", "nom", "prenoms", "contact", "date_de_premier_culte").order("member_id"))
+        )
+        membres = {membre["member_id"]: membre for membre in lignes_membres}
+        membres_permanents = [member_id for member_id, membre in membres.items() if membre["type_membre"] == "MEMBRE"]
+        invites = [member_id for member_id, membre in membres.items() if membre["type_membre"] == "INVITE"]
+        # Les nouvelles personnes ont une date de premier culte (invités, convertis ou non)
+        nouvelles_personnes = [member_id for member_id, membre in membres.items() if membre.get("date_de_premier_culte")]
+        
+        # Plus longue interruption passée de chaque membre, pour juger si l'absence actuelle est inhabituelle
+        plus_longues_absences = matrice.plus_longues_absences()
+        
+        # Ajouter nom, prénoms et contact aux lignes calculées par la matrice
+        def completer(lignes):
+            resultat = []
+            for ligne in lignes:
+                membre = membres.get(ligne["member_id"], {})
+                resultat.append({
+                    "Nom et Prénoms": f"{membre.get('nom', '')} {membre.get('prenoms', '')}".strip(),
+                    "Contact": membre.get("contact", ""),
+                    "Dernière présence": ligne["derniere_presence"].strftime("%d/%m/%Y"),
+                    "Cultes manqués": ligne["absences_consecutives"],
+                    "Plus longue absence passée": plus_longues_absences.get(ligne["member_id"], 0),
+                })
+            return resultat
+        
+        if st.button("Recharger l'historique", key="reload_matrix"):
+            STRUCTURES.pop("matrice", None)
+            st.rerun()
+        
+        st.markdown("---")
+        st.subheader("Membres absents plusieurs dimanches d'affilée")
+        min_absences = st.number_input("Nombre minimum de cultes manqués", min_value=1, value=3, step=1)
+        absents = completer(matrice.absences_consecutives(min_absences=min_absences, member_ids=membres_permanents))
+        if absents:
+            st.dataframe(absents, use_container_width=True, hide_index=True)
+        else:
+            st.info("Aucun membre ne correspond à ce critère.")
+        
+        st.markdown("---")
+        st.subheader("Invités venus deux fois mais pas revenus depuis")
+        sans_retour = completer(matrice.visiteurs_sans_retour(nb_visites=2, member_ids=invites))
+        if sans_retour:
+            st.dataframe(sans_retour, use_container_width=True, hide_index=True)
+        else:
+            st.info("Aucun invité ne correspond à ce critère.")
+        
+        st.markdown("---")
+        st.subheader("Taux de retour des nouvelles personnes")
+        horizon = st.number_input("Revenus dans les N cultes suivants", min_value=1, value=4, step=1)
+        retention = [{
+            "Premier culte": ligne["date"].strftime("%d/%m/%Y"),
+            "Nouvelles personnes": ligne["nouveaux"],
+            "Revenues": ligne["revenus"],
+            "Taux de retour": f"{ligne['taux']:.0%}",
+        } for ligne in reversed(matrice.taux_retention(nouvelles_personnes, horizon=horizon))]
+        if retention:
+            st.dataframe(retention, use_container_width=True, hide_index=True)
+        else:
+            st.info("Aucune présence enregistrée pour le moment.")
+    
+    except Exception as e:
+        st.error(f"Erreur lors du calcul des listes de suivi: {e}")
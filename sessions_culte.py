@@ -0,0 +1,99 @@
+import threading
+from datetime import date
+
+# Sites et cultes proposés dans la barre latérale
+SITES = ["Principal"]
+SERVICES = ["Premier culte", "Deuxième culte"]
+
+# Nombre de lignes récupérées par requête lors du préchargement
+TAILLE_PAGE = 1000
+
+
+# Session de culte (site, service, date) avec l'ensemble des membres déjà présents.
+# L'ensemble est chargé au démarrage de la session puis mis à jour à chaque
+# enregistrement, ce qui évite une requête par contrôle de doublon.
+class SessionCulte:
+    def __init__(self, site, service, jour):
+        self.site = site
+        self.service = service
+        self.jour = jour
+        self.presents = set()
+        self.verrou = threading.Lock()
+
+    # Champs à ajouter aux lignes de fact_presence_au_culte
+    def champs_presence(self):
+        return {
+            "date": self.jour.isoformat(),
+            "site": self.site,
+            "service": self.service,
+        }
+
+    # Chargement des présences déjà enregistrées pour cette session
+    def demarrer(self, supabase):
+        presents = set()
+        debut = 0
+        while True:
+            response = supabase.table("fact_presence_au_culte").select("member_id").eq("date", self.jour.isoformat()).eq("site", self.site).eq("service", self.service).order("id").range(debut, debut + TAILLE_PAGE - 1).execute()
+            presents.update(entry["member_id"] for entry in response.data)
+            if len(response.data) < TAILLE_PAGE:
+                break
+            debut += TAILLE_PAGE
+        with self.verrou:
+            self.presents |= presents
+        return self
+
+    # Réserve la présence du membre ; renvoie False s'il est déjà enregistré
+    def reserver(self, member_id):
+        with self.verrou:
+            if member_id in self.presents:
+                return False
+            self.presents.add(member_id)
+            return True
+
+    # Annule une réservation si l'insertion en base a échoué
+    def liberer(self, member_id):
+        with self.verrou:
+            self.presents.discard(member_id)
+
+    def renommer_membre(self, ancien_id, nouveau_id):
+        with self.verrou:
+            if ancien_id in self.presents:
+                self.presents.discard(ancien_id)
+                self.presents.add(nouveau_id)
+
+    @property
+    def nb_presents(self):
+        return len(self.presents)
+
+
+# Registre des sessions en cours, partagé entre toutes les connexions
+class RegistreSessions:
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self.sessions = {}
+        self.verrou = threading.Lock()
+
+    # Oublier les sessions des jours passés (à appeler sous le verrou)
+    def _purger(self):
+        aujourd_hui = date.today()
+        for cle in [cle for cle in self.sessions if cle[2] < aujourd_hui]:
+            del self.sessions[cle]
+
+    # Renvoie la session demandée en la démarrant au premier accès.
+    # Le préchargement se fait hors du verrou pour ne pas bloquer les autres connexions.
+    def session(self, site, service, jour=None):
+        cle = (site, service, jour or date.today())
+        with self.verrou:
+            self._purger()
+            session = self.sessions.get(cle)
+        if session is not None:
+            return session
+        session = SessionCulte(*cle).demarrer(self.supabase)
+        with self.verrou:
+            return self.sessions.setdefault(cle, session)
+
+    def renommer_membre(self, ancien_id, nouveau_id):
+        with self.verrou:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.renommer_membre(ancien_id, nouveau_id)
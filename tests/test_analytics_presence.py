@@ -0,0 +1,99 @@
+from datetime import date
+
+from analytics_presence import MatricePresence
+
+D1, D2, D3, D4, D5 = (date(2024, 1, 7), date(2024, 1, 14), date(2024, 1, 21), date(2024, 1, 28), date(2024, 2, 4))
+
+
+def matrice_depuis(presences):
+    return MatricePresence.depuis_lignes([{"member_id": m, "date": d.isoformat()} for m, d in presences])
+
+
+def presences_de(matrice, member_id):
+    ligne = matrice.vue()[matrice.index_membres[member_id]]
+    return [jour for jour, present in zip(matrice.dates, ligne) if present]
+
+
+def test_chargement_trie_les_dates():
+    matrice = matrice_depuis([("A", D3), ("A", D1), ("B", D2)])
+    assert matrice.dates == [D1, D2, D3]
+    assert presences_de(matrice, "A") == [D1, D3]
+    assert presences_de(matrice, "B") == [D2]
+
+
+def test_insertion_d_une_date_passee_decale_les_colonnes():
+    matrice = matrice_depuis([("A", D1), ("A", D4), ("B", D3)])
+    matrice.ajouter_presence("B", D2)
+    matrice.ajouter_presence("C", D5.isoformat())
+
+    assert matrice.dates == [D1, D2, D3, D4, D5]
+    assert matrice.index_dates == {D1: 0, D2: 1, D3: 2, D4: 3, D5: 4}
+    assert presences_de(matrice, "A") == [D1, D4]
+    assert presences_de(matrice, "B") == [D2, D3]
+    assert presences_de(matrice, "C") == [D5]
+
+
+def test_agrandissement_conserve_les_presences():
+    matrice = MatricePresence(capacite_membres=2, capacite_dates=2)
+    for i in range(5):
+        matrice.ajouter_presence(f"M{i}", date(2024, 1, 1 + i))
+    matrice.ajouter_presence("M0", date(2024, 1, 5))
+
+    assert matrice.bits.shape == (8, 8)
+    assert matrice.vue().sum() == 6
+    assert presences_de(matrice, "M0") == [date(2024, 1, 1), date(2024, 1, 5)]
+    assert presences_de(matrice, "M4") == [date(2024, 1, 5)]
+
+
+def test_renommer_membre():
+    matrice = matrice_depuis([("TEMP001", D1)])
+    matrice.renommer_membre("TEMP001", "MEMBER00001")
+    matrice.ajouter_presence("MEMBER00001", D2)
+    assert matrice.member_ids == ["MEMBER00001"]
+    assert presences_de(matrice, "MEMBER00001") == [D1, D2]
+
+
+def test_absences_consecutives():
+    matrice = matrice_depuis([("A", D1), ("A", D2), ("B", D1), ("B", D5), ("C", D1), ("D", D3), ("D", D4)])
+    absents = matrice.absences_consecutives(min_absences=1)
+    assert [(ligne["member_id"], ligne["absences_consecutives"], ligne["derniere_presence"]) for ligne in absents] == [
+        ("C", 4, D1),
+        ("A", 3, D2),
+        ("D", 1, D4),
+    ]
+    assert [ligne["member_id"] for ligne in matrice.absences_consecutives(min_absences=1, member_ids=["A", "D"])] == ["A", "D"]
+
+
+def test_visiteurs_sans_retour():
+    matrice = matrice_depuis([("A", D1), ("A", D2), ("B", D2), ("B", D5), ("C", D1), ("C", D2), ("C", D3), ("E", D1), ("E", D3), ("F", D4)])
+    sans_retour = matrice.visiteurs_sans_retour(nb_visites=2)
+    assert [(ligne["member_id"], ligne["absences_consecutives"]) for ligne in sans_retour] == [("A", 3), ("E", 2)]
+    assert [ligne["member_id"] for ligne in matrice.visiteurs_sans_retour(member_ids=["E"])] == ["E"]
+
+
+def test_plus_longues_absences():
+    matrice = matrice_depuis([("A", D1), ("A", D2), ("A", D5), ("B", D1), ("B", D3), ("B", D4), ("C", D4)])
+    assert matrice.plus_longues_absences() == {"A": 2, "B": 1, "C": 0}
+
+
+def test_taux_retention_limite_aux_nouveaux_et_aux_cohortes_completes():
+    matrice = matrice_depuis([
+        ("ANCIEN", D1), ("ANCIEN", D2),
+        ("N1", D1), ("N1", D3),
+        ("N2", D1),
+        ("N3", D2), ("N3", D5),
+        ("N4", D4),
+    ])
+    retention = matrice.taux_retention(["N1", "N2", "N3", "N4"], horizon=2)
+    assert retention == [
+        {"date": D1, "nouveaux": 2, "revenus": 1, "taux": 0.5},
+        {"date": D2, "nouveaux": 1, "revenus": 0, "taux": 0.0},
+    ]
+
+
+def test_matrice_vide():
+    matrice = matrice_depuis([])
+    assert matrice.absences_consecutives() == []
+    assert matrice.visiteurs_sans_retour() == []
+    assert matrice.taux_retention([]) == []
+    assert matrice.plus_longues_absences() == {}
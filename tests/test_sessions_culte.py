@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+
+import sessions_culte
+from sessions_culte import RegistreSessions, SessionCulte
+
+
+class ReponseFactice:
+    def __init__(self, data):
+        self.data = data
+
+
+# Requête Supabase minimale : ignore les filtres et renvoie les lignes demandées par range()
+class RequeteFactice:
+    def __init__(self, lignes, appels):
+        self.lignes = lignes
+        self.appels = appels
+
+    def select(self, *colonnes):
+        return self
+
+    def eq(self, colonne, valeur):
+        return self
+
+    def order(self, colonne):
+        return self
+
+    def range(self, debut, fin):
+        self.debut, self.fin = debut, fin
+        return self
+
+    def execute(self):
+        self.appels.append((self.debut, self.fin))
+        return ReponseFactice(self.lignes[self.debut:self.fin + 1])
+
+
+class SupabaseFactice:
+    def __init__(self, lignes=()):
+        self.lignes = list(lignes)
+        self.appels = []
+
+    def table(self, nom):
+        return RequeteFactice(self.lignes, self.appels)
+
+
+def test_demarrer_charge_les_presents_page_par_page(monkeypatch):
+    monkeypatch.setattr(sessions_culte, "TAILLE_PAGE", 2)
+    supabase = SupabaseFactice([{"member_id": m} for m in ("A", "B", "C", "A")])
+    session = SessionCulte("Principal", "Premier culte", date.today()).demarrer(supabase)
+    assert session.presents == {"A", "B", "C"}
+    assert supabase.appels == [(0, 1), (2, 3), (4, 5)]
+
+
+def test_reserver_et_liberer():
+    session = SessionCulte("Principal", "Premier culte", date.today())
+    assert session.reserver("M1") is True
+    assert session.reserver("M1") is False
+    assert session.nb_presents == 1
+
+    session.liberer("M1")
+    assert session.reserver("M1") is True
+
+
+def test_renommer_membre():
+    session = SessionCulte("Principal", "Premier culte", date.today())
+    session.reserver("TEMP001")
+    session.renommer_membre("TEMP001", "MEMBER00001")
+    assert session.presents == {"MEMBER00001"}
+
+
+def test_session_est_demarree_une_seule_fois():
+    supabase = SupabaseFactice([{"member_id": "A"}])
+    registre = RegistreSessions(supabase)
+    premiere = registre.session("Principal", "Premier culte")
+    assert registre.session("Principal", "Premier culte") is premiere
+    assert premiere.presents == {"A"}
+    assert len(supabase.appels) == 1
+    assert registre.session("Principal", "Deuxième culte") is not premiere
+
+
+def test_session_concurrente_conserve_la_premiere_inseree(monkeypatch):
+    registre = RegistreSessions(SupabaseFactice())
+    cle = ("Principal", "Premier culte", date.today())
+    gagnante = SessionCulte(*cle)
+    demarrer = SessionCulte.demarrer
+
+    # Une autre connexion termine son préchargement pendant celui-ci
+    def demarrer_en_concurrence(session, supabase):
+        registre.sessions[cle] = gagnante
+        return demarrer(session, supabase)
+
+    monkeypatch.setattr(SessionCulte, "demarrer", demarrer_en_concurrence)
+    assert registre.session(*cle) is gagnante
+    assert registre.sessions == {cle: gagnante}
+
+
+def test_sessions_des_jours_passes_sont_purgees():
+    registre = RegistreSessions(SupabaseFactice())
+    hier = ("Principal", "Premier culte", date.today() - timedelta(days=1))
+    registre.sessions[hier] = SessionCulte(*hier)
+
+    registre.session("Principal", "Premier culte")
+    assert hier not in registre.sessions
+    assert list(registre.sessions) == [("Principal", "Premier culte", date.today())]
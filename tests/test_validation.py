@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+
+from validation import IndexContacts, normaliser_champ, valider_champ, valider_formulaire
+
+
+def test_changement_de_contact_libere_l_ancien_numero():
+    index = IndexContacts()
+    index.enregistrer("M1", "DOE", "John", "+2250102030405", "john@doe.com")
+    index.enregistrer("M1", "DOE", "John", "+2250909090909")
+
+    ancien_contact = normaliser_champ("contact", "0102030405")
+    assert index.verifier_champ("contact", ancien_contact, "KONE", "Awa") is None
+    assert index.verifier_champ("contact", "+2250909090909", "KONE", "Awa") is not None
+    # Un email non renseigné lors de la mise à jour reste attribué au membre
+    assert index.verifier_champ("email", "john@doe.com", "KONE", "Awa") is not None
+
+
+def test_changement_d_email_apres_conversion():
+    index = IndexContacts()
+    index.enregistrer("TEMP001", "DOE", "John", "+2250102030405", "john@doe.com")
+    index.renommer_membre("TEMP001", "MEMBER00001")
+    index.enregistrer("MEMBER00001", "DOE", "John", email="John.Doe@mail.com")
+
+    assert index.verifier_champ("email", "john@doe.com", "KONE", "Awa") is None
+    assert index.verifier_champ("email", "john.doe@mail.com", "KONE", "Awa") is not None
+
+
+def donnees_valides(**modifications):
+    donnees = {
+        "nom": " doe ",
+        "prenoms": "john paul",
+        "sexe": "Masculin",
+        "date_naissance": date(1990, 5, 17),
+        "contact": "01 02-03.04 05",
+        "email": " John@Doe.COM ",
+        "lieu_habitation": "cocody angré",
+    }
+    donnees.update(modifications)
+    return donnees
+
+
+def test_champs_obligatoires():
+    for champ in ("nom", "prenoms", "lieu_habitation"):
+        assert valider_champ(champ, "   ") is not None
+        assert valider_champ(champ, "x") is None
+    assert valider_champ("sexe", "") == "Le sexe est obligatoire"
+    assert valider_champ("contact", "") == "Le contact est obligatoire"
+    assert valider_champ("date_naissance", None) == "La date de naissance est obligatoire"
+
+
+def test_regle_telephone():
+    assert valider_champ("contact", "+225 01 02 03 04 05") is None
+    assert valider_champ("contact", "(01) 02-03.04") is None
+    assert valider_champ("contact", "0102") == "Format de numéro invalide"
+    assert valider_champ("contact", "01a2030405") == "Format de numéro invalide"
+
+
+def test_regle_email():
+    assert valider_champ("email", "") is None
+    assert valider_champ("email", "Nom.Prenom@Domaine.ci") is None
+    assert valider_champ("email", "nom@domaine") == "Format d'email invalide"
+    assert valider_champ("email", "nom.domaine.com") == "Format d'email invalide"
+
+
+def test_regle_age_maximum():
+    assert valider_champ("date_naissance", date.today() - timedelta(days=365 * 100)) is None
+    assert valider_champ("date_naissance", date.today() - timedelta(days=365 * 121)) == "Date de naissance incorrecte"
+
+
+def test_normalisation():
+    assert normaliser_champ("nom", " doe ") == "DOE"
+    assert normaliser_champ("prenoms", "john paul") == "John Paul"
+    assert normaliser_champ("contact", "01 02 03 04 05") == "+2250102030405"
+    assert normaliser_champ("contact", "33 6 12 34 56 78") == "+33612345678"
+    assert normaliser_champ("contact", "+225 0102030405") == "+2250102030405"
+    assert normaliser_champ("email", " John@Doe.COM ") == "john@doe.com"
+    assert normaliser_champ("email", "  ") is None
+    assert normaliser_champ("lieu_habitation", "cocody angré") == "Cocody Angré"
+
+
+def test_valider_formulaire_normalise_les_donnees():
+    donnees, erreurs = valider_formulaire(donnees_valides())
+    assert erreurs == {}
+    assert donnees == {
+        "nom": "DOE",
+        "prenoms": "John Paul",
+        "sexe": "Masculin",
+        "date_naissance": date(1990, 5, 17),
+        "contact": "+2250102030405",
+        "email": "john@doe.com",
+        "lieu_habitation": "Cocody Angré",
+    }
+
+
+def test_valider_formulaire_renvoie_toutes_les_erreurs_de_saisie():
+    donnees, erreurs = valider_formulaire(donnees_valides(nom="", contact="12", email="faux"))
+    assert donnees is None
+    assert set(erreurs) == {"nom", "contact", "email"}
+
+
+def test_valider_formulaire_rejette_les_doublons():
+    index = IndexContacts()
+    index.enregistrer("M1", "KONE", "Awa", "+2250102030405", "john@doe.com")
+
+    donnees, erreurs = valider_formulaire(donnees_valides(), index)
+    assert donnees is None
+    assert set(erreurs) == {"contact", "email"}
+
+    # La même personne peut se réenregistrer avec ses propres coordonnées
+    donnees, erreurs = valider_formulaire(donnees_valides(nom="kone", prenoms="awa"), index)
+    assert erreurs == {}
+    assert donnees["nom"] == "KONE"
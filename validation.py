@@ -0,0 +1,197 @@
+import re
+import threading
+from datetime import date
+
+# Expressions régulières compilées une seule fois
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'^(\+?\d{8,15})$')
+PHONE_SEPARATORS = re.compile(r'[\s\-().]+')
+
+# Âge maximal accepté pour la date de naissance
+AGE_MAXIMUM = 120
+
+# Nombre de lignes récupérées par requête lors du chargement de l'index
+TAILLE_PAGE = 1000
+
+
+# Validation de l'email
+def is_valid_email(email):
+    return bool(EMAIL_PATTERN.match(email)) if email else True
+
+# Validation et formatage du numéro de téléphone
+def is_valid_phone(phone):
+    return bool(PHONE_PATTERN.match(PHONE_SEPARATORS.sub('', phone)))
+
+def format_phone_number(phone):
+    cleaned_phone = PHONE_SEPARATORS.sub('', phone)
+    if not cleaned_phone.startswith('+'):
+        if len(cleaned_phone) == 10:
+            cleaned_phone = "+225" + cleaned_phone
+        else:
+            cleaned_phone = "+" + cleaned_phone
+    return cleaned_phone
+
+
+# Normalisation de chaque champ avant enregistrement
+def _normaliser_email(valeur):
+    email = (valeur or "").strip().lower()
+    return email or None
+
+def _normaliser_contact(valeur):
+    contact = (valeur or "").strip()
+    return format_phone_number(contact) if contact else ""
+
+NORMALISATIONS = {
+    "nom": lambda valeur: (valeur or "").strip().upper(),
+    "prenoms": lambda valeur: (valeur or "").strip().title(),
+    "sexe": lambda valeur: valeur,
+    "date_naissance": lambda valeur: valeur,
+    "contact": _normaliser_contact,
+    "email": _normaliser_email,
+    "lieu_habitation": lambda valeur: (valeur or "").strip().title(),
+}
+
+
+# Règles de validation : chaque règle renvoie un message d'erreur ou None
+def _valider_obligatoire(message):
+    def regle(valeur):
+        if isinstance(valeur, str):
+            valeur = valeur.strip()
+        return None if valeur else message
+    return regle
+
+def _valider_date_naissance(valeur):
+    if not valeur:
+        return "La date de naissance est obligatoire"
+    if (date.today() - valeur).days // 365 > AGE_MAXIMUM:
+        return "Date de naissance incorrecte"
+    return None
+
+def _valider_contact(valeur):
+    contact = (valeur or "").strip()
+    if not contact:
+        return "Le contact est obligatoire"
+    if not is_valid_phone(contact):
+        return "Format de numéro invalide"
+    return None
+
+def _valider_email(valeur):
+    email = (valeur or "").strip().lower()
+    if email and not is_valid_email(email):
+        return "Format d'email invalide"
+    return None
+
+REGLES = {
+    "nom": _valider_obligatoire("Le nom est obligatoire"),
+    "prenoms": _valider_obligatoire("Les prénoms sont obligatoires"),
+    "sexe": _valider_obligatoire("Le sexe est obligatoire"),
+    "date_naissance": _valider_date_naissance,
+    "contact": _valider_contact,
+    "email": _valider_email,
+    "lieu_habitation": _valider_obligatoire("Le lieu d'habitation est obligatoire"),
+}
+
+
+# Valider un seul champ (utilisé pendant la saisie)
+def valider_champ(champ, valeur):
+    return REGLES[champ](valeur)
+
+def normaliser_champ(champ, valeur):
+    return NORMALISATIONS[champ](valeur)
+
+
+# Index local des contacts et emails déjà utilisés, pour détecter les doublons
+# avant tout appel réseau (contrainte unique 23505 côté base).
+class IndexContacts:
+    def __init__(self):
+        self.contacts = {}
+        self.emails = {}
+        self.identites = {}
+        self.cles_membres = {}
+        self.verrou = threading.Lock()
+
+    @classmethod
+    def depuis_supabase(cls, supabase):
+        index = cls()
+        debut = 0
+        while True:
+            response = supabase.table("dim_membres").select("member_id", "nom", "prenoms", "contact", "email").order("member_id").range(debut, debut + TAILLE_PAGE - 1).execute()
+            for membre in response.data:
+                index.enregistrer(membre["member_id"], membre["nom"], membre["prenoms"], membre.get("contact"), membre.get("email"))
+            if len(response.data) < TAILLE_PAGE:
+                break
+            debut += TAILLE_PAGE
+        return index
+
+    # Ajouter ou mettre à jour un membre dans l'index.
+    # Un nouveau contact ou email libère l'ancien ; une valeur vide conserve l'actuelle.
+    def enregistrer(self, member_id, nom, prenoms, contact=None, email=None):
+        email = email.lower() if email else None
+        with self.verrou:
+            self.identites[member_id] = (nom, prenoms)
+            ancien_contact, ancien_email = self.cles_membres.get(member_id, (None, None))
+            if contact:
+                self._liberer(self.contacts, ancien_contact, member_id)
+                self.contacts[contact] = member_id
+            if email:
+                self._liberer(self.emails, ancien_email, member_id)
+                self.emails[email] = member_id
+            self.cles_membres[member_id] = (contact or ancien_contact, email or ancien_email)
+
+    def _liberer(self, table, cle, member_id):
+        if cle is not None and table.get(cle) == member_id:
+            del table[cle]
+
+    def renommer_membre(self, ancien_id, nouveau_id):
+        with self.verrou:
+            if ancien_id in self.identites:
+                self.identites[nouveau_id] = self.identites.pop(ancien_id)
+            if ancien_id in self.cles_membres:
+                self.cles_membres[nouveau_id] = self.cles_membres.pop(ancien_id)
+            for table in (self.contacts, self.emails):
+                for cle, member_id in table.items():
+                    if member_id == ancien_id:
+                        table[cle] = nouveau_id
+
+    # Le contact ou l'email appartient-il déjà à une autre personne ?
+    def _appartient_a_autrui(self, table, cle, nom, prenoms):
+        member_id = table.get(cle)
+        return member_id is not None and self.identites.get(member_id) != (nom, prenoms)
+
+    # Vérifier un contact ou un email déjà normalisé ; renvoie un message ou None
+    def verifier_champ(self, champ, valeur, nom, prenoms):
+        if not valeur:
+            return None
+        with self.verrou:
+            if champ == "contact" and self._appartient_a_autrui(self.contacts, valeur, nom, prenoms):
+                return "Ce numéro de téléphone existe déjà, veuillez en mettre un autre"
+            if champ == "email" and self._appartient_a_autrui(self.emails, valeur, nom, prenoms):
+                return "Cet email existe déjà, veuillez en mettre un autre"
+        return None
+
+    # Renvoie les erreurs de doublon pour des données déjà normalisées
+    def verifier_doublons(self, donnees):
+        erreurs = {}
+        for champ in ("contact", "email"):
+            erreur = self.verifier_champ(champ, donnees.get(champ), donnees["nom"], donnees["prenoms"])
+            if erreur:
+                erreurs[champ] = erreur
+        return erreurs
+
+
+# Pipeline complet : validation, normalisation puis pré-contrôle des doublons.
+# Renvoie (donnees_normalisees, erreurs) ; partagé par le formulaire et les imports.
+def valider_formulaire(donnees, index_contacts=None):
+    erreurs = {}
+    for champ, regle in REGLES.items():
+        erreur = regle(donnees.get(champ))
+        if erreur:
+            erreurs[champ] = erreur
+    if erreurs:
+        return None, erreurs
+    normalisees = {champ: normaliser(donnees.get(champ)) for champ, normaliser in NORMALISATIONS.items()}
+    if index_contacts is not None:
+        erreurs = index_contacts.verifier_doublons(normalisees)
+        if erreurs:
+            return None, erreurs
+    return normalisees, {}